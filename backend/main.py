@@ -1,17 +1,24 @@
+import asyncio
 import csv
-import hashlib
 import io
-import json
 import re
-from datetime import datetime
+import sys
+import threading
+from collections import Counter
+from dataclasses import dataclass, field, fields
+from datetime import datetime, time
 from enum import Enum
-from typing import List, Optional, Dict, Any, Union
+from functools import lru_cache
+from itertools import islice
+from typing import AsyncIterator, Iterator, List, Optional, Dict, Any, Set, Tuple, Union
 
+import numpy as np
+import orjson
 import uvicorn
+import xxhash
 from fastapi import FastAPI, UploadFile, File, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel, Field, field_validator
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
 # ========== MODELS ==========
 class LogLevel(str, Enum):
@@ -29,6 +36,37 @@ class OperationType(str, Enum):
     UNKNOWN = "unknown"
 
 
+# Коды enum-значений для колонок uint8 (LogColumns)
+LEVEL_CODES = {level.value: code for code, level in enumerate(LogLevel)}
+OPERATION_CODES = {operation.value: code for code, operation in enumerate(OperationType)}
+# Уровень по значению без вызова Enum и исключения на неизвестных строках
+LEVELS_BY_VALUE = {level.value: level for level in LogLevel}
+
+# Поля с малым числом различных значений, которые хранятся одной копией на значение
+INTERNED_FIELDS = (
+    '@level', '@module', 'module', '@caller', 'caller', 'tf_resource_type', 'tf_data_source_type',
+    'tf_rpc', 'tf_provider_addr', 'tf_proto_version', 'tf_http_op_type', 'tf_http_req_method',
+    'tf_http_req_version', 'tf_http_res_version', 'tf_http_res_status_reason'
+)
+
+# Символы, с которых может начинаться JSON-документ
+JSON_START_CHARS = frozenset('{["-0123456789tfn')
+
+# Ключевые слова уровня ищутся одним проходом. 'trace' матчится как 'trac' + lookahead,
+# чтобы не поглотить 'e' и не пропустить 'error' в строках вида '...tracerror'
+LEVEL_KEYWORD_RE = re.compile(r'error|failed|failure|panic|warn|debug|trac(?=e)')
+KEYWORD_LEVELS = {
+    'error': LogLevel.ERROR,
+    'failed': LogLevel.ERROR,
+    'failure': LogLevel.ERROR,
+    'panic': LogLevel.ERROR,
+    'warn': LogLevel.WARN,
+    'debug': LogLevel.DEBUG,
+    'trac': LogLevel.TRACE
+}
+KEYWORD_PRIORITY = {LogLevel.ERROR: 0, LogLevel.WARN: 1, LogLevel.DEBUG: 2, LogLevel.TRACE: 3}
+
+
 def normalize(value):
     if value is None:
         return []
@@ -39,7 +77,8 @@ def normalize(value):
     raise TypeError('Invalid type')
 
 
-class TerraformLogEntry(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class TerraformLogEntry:
     id: Optional[str] = None
     timestamp: datetime
     level: LogLevel
@@ -121,37 +160,111 @@ class TerraformLogEntry(BaseModel):
     
     # Существующие технические поля
     operation: OperationType = OperationType.UNKNOWN
-    raw_data: Dict[str, Any] = Field(default_factory=dict)
+    raw_data: Dict[str, Any] = field(default_factory=dict)
     parent_req_id: Optional[str] = None
     duration_ms: Optional[int] = None
-    json_blocks: List[Dict] = Field(default_factory=list)
+    json_blocks: List[Dict] = field(default_factory=list)
     read: bool = False
     parse_error: bool = False
     error_type: Optional[str] = None
+    # timestamp.isoformat() из первого to_dict(); timestamp после загрузки не меняется
+    _timestamp_iso: Optional[str] = field(default=None, init=False, repr=False, compare=False)
 
     def to_dict(self):
-        data = self.model_dump()
-        data['timestamp'] = self.timestamp.isoformat()
+        data = {name: getattr(self, name) for name in ENTRY_FIELDS}
+        if self._timestamp_iso is None:
+            self._timestamp_iso = self.timestamp.isoformat()
+        data['timestamp'] = self._timestamp_iso
         data['level'] = self.level.value
         data['operation'] = self.operation.value
         return data
 
-    @field_validator('Cache_Control', mode='before')
-    def _norm_cache(cls, v):
-        return normalize(v)
-
-    @field_validator('Vary', mode='before')
-    def _norm_vary(cls, v):
-        return normalize(v)
-
-    # Опционально: гарантировать конечный тип — список строк
-    @field_validator('Cache_Control', mode='after')
-    def _ensure_cache_list(cls, v):
-        return list(v) if isinstance(v, (list, tuple)) else [v]
 
-    @field_validator('Vary', mode='after')
-    def _ensure_vary_list(cls, v):
-        return list(v) if isinstance(v, (list, tuple)) else [v]
+ENTRY_FIELDS = tuple(f.name for f in fields(TerraformLogEntry) if f.init)
+# Заголовки, которые могут прийти строкой через запятую, хранятся списком
+LIST_HEADER_FIELDS = ('Cache_Control', 'Vary')
+
+# Поле модели -> поля исходной строки, из которых оно берется, в порядке приоритета
+FIELD_MAPPINGS = {
+    'caller': ['caller', '@caller'],
+    'Accept': ['Accept'],
+    'Accept_Encoding': ['Accept-Encoding', 'Accept_Encoding'],
+    'Access_Control_Expose_Headers': ['Access-Control-Expose-Headers', 'Access_Control_Expose_Headers'],
+    'Cache_Control': ['Cache-Control', 'Cache_Control'],
+    'Connection': ['Connection'],
+    'Content_Length': ['Content-Length', 'Content_Length'],
+    'Content_Security_Policy': ['Content-Security-Policy', 'Content_Security_Policy'],
+    'Content_Type': ['Content-Type', 'Content_Type'],
+    'Date': ['Date'],
+    'EXTRA_VALUE_AT_END': ['EXTRA_VALUE_AT_END'],
+    'Etag': ['Etag'],
+    'Expires': ['Expires'],
+    'Host': ['Host'],
+    'Keep_Alive': ['Keep-Alive', 'Keep_Alive'],
+    'Permissions_Policy': ['Permissions-Policy', 'Permissions_Policy'],
+    'Pragma': ['Pragma'],
+    'Referrer_Policy': ['Referrer-Policy', 'Referrer_Policy'],
+    'Server': ['Server'],
+    'Set_Cookie': ['Set-Cookie', 'Set_Cookie'],
+    'Strict_Transport_Security': ['Strict-Transport-Security', 'Strict_Transport_Security'],
+    'User_Agent': ['User-Agent', 'User_Agent'],
+    'Vary': ['Vary'],
+    'Via': ['Via'],
+    'X_Content_Type_Options': ['X-Content-Type-Options', 'X_Content_Type_Options'],
+    'X_Frame_Options': ['X-Frame-Options', 'X_Frame_Options'],
+    'X_Kong_Proxy_Latency': ['X-Kong-Proxy-Latency', 'X_Kong_Proxy_Latency'],
+    'X_Kong_Upstream_Latency': ['X-Kong-Upstream-Latency', 'X_Kong_Upstream_Latency'],
+    'X_Request_Id': ['X-Request-Id', 'X_Request_Id'],
+    'X_Runtime': ['X-Runtime', 'X_Runtime'],
+    'address': ['address'],
+    'args': ['args'],
+    'channel': ['channel'],
+    'description': ['description'],
+    'diagnostic_attribute': ['diagnostic_attribute'],
+    'diagnostic_detail': ['diagnostic_detail'],
+    'diagnostic_error_count': ['diagnostic_error_count'],
+    'diagnostic_severity': ['diagnostic_severity'],
+    'diagnostic_summary': ['diagnostic_summary'],
+    'diagnostic_warning_count': ['diagnostic_warning_count'],
+    'err': ['err'],
+    'len': ['len'],
+    'network': ['network'],
+    'path': ['path'],
+    'pid': ['pid'],
+    'plugin': ['plugin'],
+    'tf_registry_stdout': ['tf-registry.t1.cloud/t1cloud/t1cloud:stdout', 'tf_registry_stdout'],
+    'tf_attribute_path': ['tf_attribute_path'],
+    'tf_client_capability_deferral_allowed': ['tf_client_capability_deferral_allowed'],
+    'tf_client_capability_write_only_attributes_allowed': ['tf_client_capability_write_only_attributes_allowed'],
+    'tf_data_source_type': ['tf_data_source_type'],
+    'tf_http_op_type': ['tf_http_op_type'],
+    'tf_http_req_body': ['tf_http_req_body'],
+    'tf_http_req_method': ['tf_http_req_method'],
+    'tf_http_req_uri': ['tf_http_req_uri'],
+    'tf_http_req_version': ['tf_http_req_version'],
+    'tf_http_res_body': ['tf_http_res_body'],
+    'tf_http_res_status_code': ['tf_http_res_status_code'],
+    'tf_http_res_status_reason': ['tf_http_res_status_reason'],
+    'tf_http_res_version': ['tf_http_res_version'],
+    'tf_http_trans_id': ['tf_http_trans_id'],
+    'tf_proto_version': ['tf_proto_version'],
+    'tf_provider_addr': ['tf_provider_addr'],
+    'tf_req_duration_ms': ['tf_req_duration_ms'],
+    'tf_req_id': ['tf_req_id'],
+    'tf_resource_type': ['tf_resource_type'],
+    'tf_rpc': ['tf_rpc'],
+    'tf_server_capability_get_provider_schema_optional': ['tf_server_capability_get_provider_schema_optional'],
+    'tf_server_capability_move_resource_state': ['tf_server_capability_move_resource_state'],
+    'tf_server_capability_plan_destroy': ['tf_server_capability_plan_destroy'],
+    'version': ['version']
+}
+# Обратное отображение: исходное поле -> (поле модели, более приоритетный источник).
+# При разборе перебираются только поля, которые реально есть в строке
+SOURCE_FIELD_TARGETS = {
+    source_field: (model_field, source_fields[0] if priority else None)
+    for model_field, source_fields in FIELD_MAPPINGS.items()
+    for priority, source_field in enumerate(source_fields)
+}
 
 
 # ========== ENHANCED PARSER ==========
@@ -169,6 +282,30 @@ class RobustTerraformParser:
             r'validate', r'validation', r'validating',
             r'ValidateResourceConfig', r'ValidateDataResourceConfig'
         ]
+        # Паттерны компилируются один раз, а не на каждой строке лога
+        self._plan_res = self._compile_buckets(self.plan_patterns)
+        self._apply_res = self._compile_buckets(self.apply_patterns)
+        self._validate_res = self._compile_buckets(self.validate_patterns)
+        self._field_patterns = [
+            ('@timestamp', re.compile(r'"@timestamp"\s*:\s*"([^"]+)"')),
+            ('@level', re.compile(r'"@level"\s*:\s*"([^"]+)"')),
+            ('@message', re.compile(r'"@message"\s*:\s*"([^"]*)"')),
+            ('@module', re.compile(r'"@module"\s*:\s*"([^"]*)"')),
+            ('tf_req_id', re.compile(r'"tf_req_id"\s*:\s*"([^"]*)"')),
+            ('tf_resource_type', re.compile(r'"tf_resource_type"\s*:\s*"([^"]*)"')),
+            ('tf_rpc', re.compile(r'"tf_rpc"\s*:\s*"([^"]*)"'))
+        ]
+        # Первая полная дата-время в строке, а если ее нет — первое время HH:MM:SS
+        self._timestamp_re = re.compile(
+            r'(?:.*?(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})[T\s]'
+            r'(?P<hour>\d{2}):(?P<minute>\d{2}):(?P<second>\d{2}))'
+            r'|(?:.*?(?P<tod_hour>\d{2}):(?P<tod_minute>\d{2}):(?P<tod_second>\d{2}))',
+            re.DOTALL
+        )
+        self._time_of_day_re = re.compile(r'(\d{2}):(\d{2}):(\d{2})')
+        self._plain_timestamp_re = re.compile(r'(\d{4})-(\d{2})-(\d{2}) (\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?', re.ASCII)
+        self._req_id_re = re.compile(r'req[_\-]?id[=:\s]+([a-f0-9\-]+)', re.IGNORECASE)
+        self._uuid_re = re.compile(r'([a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12})', re.IGNORECASE)
         self.rpc_hierarchy = {
             'GetProviderSchema': 'schema',
             'ValidateProviderConfig': 'validation',
@@ -177,82 +314,108 @@ class RobustTerraformParser:
             'PlanResourceChange': 'plan',
             'ApplyResourceChange': 'apply'
         }
+        rpc_group_operations = {
+            'plan': OperationType.PLAN,
+            'apply': OperationType.APPLY,
+            'validation': OperationType.VALIDATE,
+            'schema': OperationType.VALIDATE
+        }
+        self._rpc_operations = {rpc: rpc_group_operations[group] for rpc, group in self.rpc_hierarchy.items()}
+        # Повторяющиеся битые строки (tail, ретраи) не прогоняются через regex заново
+        self._extract_fields_cached = lru_cache(maxsize=4096)(self._extract_fields_with_regex)
         self.last_valid_timestamp = None  # Для обработки записей без timestamp
 
-    def parse_log_file(self, file_content: str, filename: str = "") -> List[TerraformLogEntry]:
+    @staticmethod
+    def _compile_buckets(patterns: List[str]) -> List[re.Pattern]:
+        # Паттерны группируются по первой букве: у каждой группы общий литеральный
+        # префикс, и re ищет его быстрым сканированием. Сообщение уже в нижнем
+        # регистре, поэтому паттерны тоже приводятся к нему и компилируются без re.I
+        buckets = {}
+        for pattern in patterns:
+            buckets.setdefault(pattern[0].lower(), []).append(pattern.lower())
+        return [re.compile('|'.join(group)) for group in buckets.values()]
+
+    @staticmethod
+    def _search_any(patterns: List[re.Pattern], text: str) -> bool:
+        return any(pattern.search(text) for pattern in patterns)
+
+    def parse_log_file(self, file_content: bytes, filename: str = "") -> List[TerraformLogEntry]:
+        entries = self.parse_lines(file_content, filename)
+        return self.finalize_entries(entries)
+
+    def parse_lines(self, file_content: bytes, filename: str = "", first_line_num: int = 1) -> List[TerraformLogEntry]:
         entries = []
-        lines = file_content.strip().split('\n')
 
-        for line_num, line in enumerate(lines, 1):
+        # Строки декодируются по одной, без полной копии файла в str и списка всех строк
+        for line_num, raw_line in enumerate(io.BytesIO(file_content), first_line_num):
+            line = raw_line.decode('utf-8').rstrip('\n')
             if line.strip():
                 entry = self.parse_line_robust(line, line_num, filename)
                 if entry:
                     entries.append(entry)
-                    if hasattr(entry, 'raw_data') and isinstance(entry.raw_data, dict):
-                        raw_uploaded_logs.append(entry.raw_data)
 
+        return entries
+
+    def finalize_entries(self, entries: List[TerraformLogEntry]) -> List[TerraformLogEntry]:
         return self._enhance_with_relationships(entries)
 
     def parse_line_robust(self, line: str, line_num: int, filename: str = "") -> Optional[TerraformLogEntry]:
-        try:
-            data = json.loads(line)
-            return self._create_entry_from_data(data, line_num, filename, line)
-        except json.JSONDecodeError:
-            repaired_data = self._repair_json_line(line)
-            if repaired_data:
-                try:
-                    data = json.loads(repaired_data)
-                    return self._create_entry_from_data(data, line_num, filename, line, parse_error=True,
-                                                        error_type="repaired_json")
-                except:
-                    pass
+        # Текстовые строки, которые не могут быть JSON, не доходят до orjson и его исключения
+        first_char = line[:1]
+        if first_char in JSON_START_CHARS or first_char.isspace():
+            try:
+                data = orjson.loads(line)
+                return self._create_entry_from_data(data, line_num, filename, line)
+            except orjson.JSONDecodeError:
+                pass
+
+        return self._parse_broken_line(line, line_num, filename)
+
+    def _parse_broken_line(self, line: str, line_num: int, filename: str) -> TerraformLogEntry:
+        repaired_data = self._repair_json_line(line)
+        if repaired_data:
+            try:
+                data = orjson.loads(repaired_data)
+                return self._create_entry_from_data(data, line_num, filename, line, parse_error=True,
+                                                    error_type="repaired_json")
+            except:
+                pass
 
-            extracted_data = self._extract_fields_with_regex(line)
-            if extracted_data:
-                return self._create_entry_from_data(extracted_data, line_num, filename, line, parse_error=True,
-                                                    error_type="regex_extracted")
+        extracted_data = self._extract_fields_cached(line)
+        if extracted_data:
+            return self._create_entry_from_data(dict(extracted_data), line_num, filename, line, parse_error=True,
+                                                error_type="regex_extracted")
 
-            return self._create_error_entry(line, line_num, filename, "json_parse_error")
+        return self._create_error_entry(line, line_num, filename, "json_parse_error")
 
     def _repair_json_line(self, line: str) -> Optional[str]:
         if line.startswith('{') and not line.endswith('}'):
             repaired = line.strip()
-            if not repaired.endswith('"'):
-                repaired += '"'
-            repaired += '}'
-            return repaired
-
-        json_match = re.search(r'(\{.*)', line)
-        if json_match:
-            partial_json = json_match.group(1)
-            if not partial_json.endswith('}'):
-                partial_json += '}'
-            return partial_json
+            return repaired + '}' if repaired.endswith('"') else repaired + '"}'
 
-        return None
+        brace_pos = line.find('{')
+        if brace_pos == -1:
+            return None
+        partial_json = line[brace_pos:]
+        return partial_json if partial_json.endswith('}') else partial_json + '}'
 
     def _extract_fields_with_regex(self, line: str) -> Optional[Dict[str, Any]]:
         extracted = {}
-        patterns = {
-            'timestamp': r'"@timestamp"\s*:\s*"([^"]+)"',
-            'level': r'"@level"\s*:\s*"([^"]+)"',
-            'message': r'"@message"\s*:\s*"([^"]*)"',
-            'module': r'"@module"\s*:\s*"([^"]*)"',
-            'tf_req_id': r'"tf_req_id"\s*:\s*"([^"]*)"',
-            'tf_resource_type': r'"tf_resource_type"\s*:\s*"([^"]*)"',
-            'tf_rpc': r'"tf_rpc"\s*:\s*"([^"]*)"'
-        }
-
-        for field, pattern in patterns.items():
-            match = re.search(pattern, line)
+        for key, pattern in self._field_patterns:
+            match = pattern.search(line)
             if match:
-                key = f"@{field}" if field in ['timestamp', 'level', 'message', 'module'] else field
                 extracted[key] = match.group(1)
 
         return extracted if extracted else None
 
     def _create_entry_from_data(self, data: Dict, line_num: int, filename: str, original_line: str,
                                 parse_error: bool = False, error_type: str = None) -> TerraformLogEntry:
+        # Интернирование прямо в data: иначе исходные копии строк остались бы жить в raw_data
+        for key in INTERNED_FIELDS:
+            value = data.get(key)
+            if isinstance(value, str):
+                data[key] = sys.intern(value)
+
         timestamp = self._heuristic_parse_timestamp(data, original_line)
         if timestamp:
             self.last_valid_timestamp = timestamp
@@ -264,11 +427,19 @@ class RobustTerraformParser:
         tf_req_id = self._heuristic_find_req_id(data, original_line)
         json_blocks = self._extract_json_blocks(data)
 
+        # Срез исходной строки нужен только без @message и message
+        if '@message' in data:
+            message = data['@message']
+        elif 'message' in data:
+            message = data['message']
+        else:
+            message = original_line[:200]
+
         entry_data = {
-            'id': f"{timestamp.timestamp()}-{line_num}-{hashlib.md5(original_line.encode()).hexdigest()[:8]}",
+            'id': f"{timestamp.timestamp()}-{line_num}-{xxhash.xxh3_64_intdigest(original_line.encode()) & 0xFFFFFFFF:08x}",
             'timestamp': timestamp,
             'level': level,
-            'message': data.get('@message', data.get('message', original_line[:200])),
+            'message': message,
             'module': data.get('@module', data.get('module')),
             'tf_req_id': tf_req_id,
             'tf_resource_type': data.get('tf_resource_type'),
@@ -282,96 +453,30 @@ class RobustTerraformParser:
             'error_type': error_type
         }
 
-        entry_data2 = entry_data.copy()
-
-        field_mappings = {
-            'caller': ['caller', '@caller'],
-            'Accept': ['Accept'],
-            'Accept_Encoding': ['Accept-Encoding', 'Accept_Encoding'],
-            'Access_Control_Expose_Headers': ['Access-Control-Expose-Headers', 'Access_Control_Expose_Headers'],
-            'Cache_Control': ['Cache-Control', 'Cache_Control'],
-            'Connection': ['Connection'],
-            'Content_Length': ['Content-Length', 'Content_Length'],
-            'Content_Security_Policy': ['Content-Security-Policy', 'Content_Security_Policy'],
-            'Content_Type': ['Content-Type', 'Content_Type'],
-            'Date': ['Date'],
-            'EXTRA_VALUE_AT_END': ['EXTRA_VALUE_AT_END'],
-            'Etag': ['Etag'],
-            'Expires': ['Expires'],
-            'Host': ['Host'],
-            'Keep_Alive': ['Keep-Alive', 'Keep_Alive'],
-            'Permissions_Policy': ['Permissions-Policy', 'Permissions_Policy'],
-            'Pragma': ['Pragma'],
-            'Referrer_Policy': ['Referrer-Policy', 'Referrer_Policy'],
-            'Server': ['Server'],
-            'Set_Cookie': ['Set-Cookie', 'Set_Cookie'],
-            'Strict_Transport_Security': ['Strict-Transport-Security', 'Strict_Transport_Security'],
-            'User_Agent': ['User-Agent', 'User_Agent'],
-            'Vary': ['Vary'],
-            'Via': ['Via'],
-            'X_Content_Type_Options': ['X-Content-Type-Options', 'X_Content_Type_Options'],
-            'X_Frame_Options': ['X-Frame-Options', 'X_Frame_Options'],
-            'X_Kong_Proxy_Latency': ['X-Kong-Proxy-Latency', 'X_Kong_Proxy_Latency'],
-            'X_Kong_Upstream_Latency': ['X-Kong-Upstream-Latency', 'X_Kong_Upstream_Latency'],
-            'X_Request_Id': ['X-Request-Id', 'X_Request_Id'],
-            'X_Runtime': ['X-Runtime', 'X_Runtime'],
-            'address': ['address'],
-            'args': ['args'],
-            'channel': ['channel'],
-            'description': ['description'],
-            'diagnostic_attribute': ['diagnostic_attribute'],
-            'diagnostic_detail': ['diagnostic_detail'],
-            'diagnostic_error_count': ['diagnostic_error_count'],
-            'diagnostic_severity': ['diagnostic_severity'],
-            'diagnostic_summary': ['diagnostic_summary'],
-            'diagnostic_warning_count': ['diagnostic_warning_count'],
-            'err': ['err'],
-            'len': ['len'],
-            'network': ['network'],
-            'path': ['path'],
-            'pid': ['pid'],
-            'plugin': ['plugin'],
-            'tf_registry_stdout': ['tf-registry.t1.cloud/t1cloud/t1cloud:stdout', 'tf_registry_stdout'],
-            'tf_attribute_path': ['tf_attribute_path'],
-            'tf_client_capability_deferral_allowed': ['tf_client_capability_deferral_allowed'],
-            'tf_client_capability_write_only_attributes_allowed': ['tf_client_capability_write_only_attributes_allowed'],
-            'tf_data_source_type': ['tf_data_source_type'],
-            'tf_http_op_type': ['tf_http_op_type'],
-            'tf_http_req_body': ['tf_http_req_body'],
-            'tf_http_req_method': ['tf_http_req_method'],
-            'tf_http_req_uri': ['tf_http_req_uri'],
-            'tf_http_req_version': ['tf_http_req_version'],
-            'tf_http_res_body': ['tf_http_res_body'],
-            'tf_http_res_status_code': ['tf_http_res_status_code'],
-            'tf_http_res_status_reason': ['tf_http_res_status_reason'],
-            'tf_http_res_version': ['tf_http_res_version'],
-            'tf_http_trans_id': ['tf_http_trans_id'],
-            'tf_proto_version': ['tf_proto_version'],
-            'tf_provider_addr': ['tf_provider_addr'],
-            'tf_req_duration_ms': ['tf_req_duration_ms'],
-            'tf_req_id': ['tf_req_id'],
-            'tf_resource_type': ['tf_resource_type'],
-            'tf_rpc': ['tf_rpc'],
-            'tf_server_capability_get_provider_schema_optional': ['tf_server_capability_get_provider_schema_optional'],
-            'tf_server_capability_move_resource_state': ['tf_server_capability_move_resource_state'],
-            'tf_server_capability_plan_destroy': ['tf_server_capability_plan_destroy'],
-            'version': ['version']
-        }
-
-        for model_field, source_fields in field_mappings.items():
-            for source_field in source_fields:
-                if source_field in data:
-                    entry_data[model_field] = data[source_field]
-                    break
+        # Поля из FIELD_MAPPINGS собираются отдельно: если они не нормализуются,
+        # запись создается только из базовых полей
+        mapped_fields = {}
+        for source_field, value in data.items():
+            target = SOURCE_FIELD_TARGETS.get(source_field)
+            if target is not None:
+                model_field, preferred_source = target
+                if preferred_source is None or preferred_source not in data:
+                    mapped_fields[model_field] = value
 
         try:
-            return TerraformLogEntry(**entry_data)
+            for list_field in LIST_HEADER_FIELDS:
+                if list_field in mapped_fields:
+                    mapped_fields[list_field] = normalize(mapped_fields[list_field])
         except Exception as e:
             print(f"Error creating entry: {e}")
-            print(f"Entry data keys: {entry_data.keys()}")
-            for key, value in entry_data.items():
+            failed_data = {**entry_data, **mapped_fields}
+            print(f"Entry data keys: {failed_data.keys()}")
+            for key, value in failed_data.items():
                 print(f"  {key}: {value} (type: {type(value)})")
-            return TerraformLogEntry(**entry_data2)
+            return TerraformLogEntry(**entry_data)
+
+        entry_data.update(mapped_fields)
+        return TerraformLogEntry(**entry_data)
 
     def _create_error_entry(self, line: str, line_num: int, filename: str, error: str) -> TerraformLogEntry:
         timestamp = self._extract_timestamp_from_line(line)
@@ -393,23 +498,25 @@ class RobustTerraformParser:
         )
 
     def _extract_timestamp_from_line(self, line: str) -> Optional[datetime]:
-        patterns = [r'\d{4}-\d{2}-\d{2}[T\s]\d{2}:\d{2}:\d{2}', r'\d{2}:\d{2}:\d{2}']
-        for pattern in patterns:
-            match = re.search(pattern, line)
-            if match:
-                try:
-                    timestamp_str = match.group()
-                    for fmt in ['%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%H:%M:%S']:
-                        try:
-                            if fmt == '%H:%M:%S':
-                                today = datetime.now().date()
-                                return datetime.combine(today, datetime.strptime(timestamp_str, fmt).time())
-                            return datetime.strptime(timestamp_str, fmt)
-                        except:
-                            continue
-                except:
-                    continue
-        return None
+        match = self._timestamp_re.match(line)
+        if match is None:
+            return None
+
+        if match['year']:
+            try:
+                return datetime(int(match['year']), int(match['month']), int(match['day']),
+                                int(match['hour']), int(match['minute']), int(match['second']))
+            except ValueError:
+                pass
+            # Некорректная дата: как и раньше, берется первое время HH:MM:SS в строке
+            hour, minute, second = self._time_of_day_re.search(line).groups()
+        else:
+            hour, minute, second = match['tod_hour'], match['tod_minute'], match['tod_second']
+
+        try:
+            return datetime.combine(datetime.now().date(), time(int(hour), int(minute), int(second)))
+        except ValueError:
+            return None
 
     def _heuristic_parse_timestamp(self, data: Dict, original_line: str = "") -> Optional[datetime]:
         timestamp_str = data.get('@timestamp') or data.get('timestamp')
@@ -417,6 +524,11 @@ class RobustTerraformParser:
             try:
                 if 'T' in timestamp_str:
                     return datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+                match = self._plain_timestamp_re.fullmatch(timestamp_str)
+                if match:
+                    year, month, day, hour, minute, second, fraction = match.groups()
+                    return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second),
+                                    int(fraction.ljust(6, '0')) if fraction else 0)
                 for fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f']:
                     try:
                         return datetime.strptime(timestamp_str, fmt)
@@ -430,41 +542,33 @@ class RobustTerraformParser:
 
     def _heuristic_detect_level(self, data: Dict, original_line: str = "") -> LogLevel:
         level_str = data.get('@level') or data.get('level')
-        if level_str:
-            try:
-                return LogLevel(level_str.lower())
-            except:
-                pass
+        if level_str and isinstance(level_str, str):
+            level = LEVELS_BY_VALUE.get(level_str.lower())
+            if level:
+                return level
 
         message = (data.get('@message') or data.get('message') or original_line or "").lower()
-        if any(word in message for word in ['error', 'failed', 'failure', 'panic']):
-            return LogLevel.ERROR
-        elif any(word in message for word in ['warn', 'warning']):
-            return LogLevel.WARN
-        elif 'debug' in message:
-            return LogLevel.DEBUG
-        elif 'trace' in message:
-            return LogLevel.TRACE
-        return LogLevel.INFO
+        detected = None
+        for match in LEVEL_KEYWORD_RE.finditer(message):
+            level = KEYWORD_LEVELS[match.group()]
+            if level is LogLevel.ERROR:
+                return level
+            if detected is None or KEYWORD_PRIORITY[level] < KEYWORD_PRIORITY[detected]:
+                detected = level
+        return detected or LogLevel.INFO
 
     def _heuristic_detect_operation(self, data: Dict, filename: str, original_line: str = "") -> OperationType:
+        rpc_operation = self._rpc_operations.get(data.get('tf_rpc'))
+        if rpc_operation:
+            return rpc_operation
+
         message = (data.get('@message') or data.get('message') or original_line or "").lower()
-        tf_rpc = data.get('tf_rpc', '')
-
-        if tf_rpc in self.rpc_hierarchy:
-            rpc_op = self.rpc_hierarchy[tf_rpc]
-            if rpc_op == 'plan':
-                return OperationType.PLAN
-            elif rpc_op == 'apply':
-                return OperationType.APPLY
-            elif rpc_op in ['validation', 'schema']:
-                return OperationType.VALIDATE
-
-        if any(re.search(p, message, re.I) for p in self.plan_patterns):
+        # Дешевая проверка подстрок: без ключевых слов ни один паттерн не сработает
+        if 'plan' in message and self._search_any(self._plan_res, message):
             return OperationType.PLAN
-        elif any(re.search(p, message, re.I) for p in self.apply_patterns):
+        elif ('apply' in message or 'resource' in message) and self._search_any(self._apply_res, message):
             return OperationType.APPLY
-        elif any(re.search(p, message, re.I) for p in self.validate_patterns):
+        elif 'validat' in message and self._search_any(self._validate_res, message):
             return OperationType.VALIDATE
 
         if 'plan' in filename.lower():
@@ -480,13 +584,13 @@ class RobustTerraformParser:
             return req_id
 
         message = data.get('@message') or data.get('message') or original_line or ""
-        patterns = [
-            r'req[_\-]?id[=:\s]+([a-f0-9\-]+)',
-            r'([a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12})'
-        ]
+        if 'req' in message.lower():
+            req_match = self._req_id_re.search(message)
+            if req_match:
+                return req_match.group(1)
 
-        for pattern in patterns:
-            req_match = re.search(pattern, message, re.IGNORECASE)
+        if len(message) >= 36 and '-' in message:
+            req_match = self._uuid_re.search(message)
             if req_match:
                 return req_match.group(1)
         return None
@@ -497,10 +601,14 @@ class RobustTerraformParser:
 
         for field in json_fields:
             if field in data and data[field]:
+                json_data = data[field]
+                # Тела, которые не могут быть JSON, сразу сохраняются как есть, без исключения из orjson
+                if isinstance(json_data, str) and json_data.lstrip(' \t\n\r')[:1] not in JSON_START_CHARS:
+                    json_blocks.append({'type': field, 'data': json_data, 'expanded': False, 'raw': True})
+                    continue
                 try:
-                    json_data = data[field]
                     if isinstance(json_data, str):
-                        json_data = json.loads(json_data)
+                        json_data = orjson.loads(json_data)
                     json_blocks.append({'type': field, 'data': json_data, 'expanded': False})
                 except:
                     json_blocks.append({'type': field, 'data': data[field], 'expanded': False, 'raw': True})
@@ -508,49 +616,112 @@ class RobustTerraformParser:
         return json_blocks
 
     def _enhance_with_relationships(self, entries: List[TerraformLogEntry]) -> List[TerraformLogEntry]:
+        # req_id -> [start_time, end_time, entries]: границы считаются в том же проходе, что и группировка
         req_groups = {}
         for entry in entries:
             if entry.tf_req_id:
-                if entry.tf_req_id not in req_groups:
-                    req_groups[entry.tf_req_id] = []
-                req_groups[entry.tf_req_id].append(entry)
+                group = req_groups.get(entry.tf_req_id)
+                if group is None:
+                    req_groups[entry.tf_req_id] = [entry.timestamp, entry.timestamp, [entry]]
+                    continue
+                if entry.timestamp < group[0]:
+                    group[0] = entry.timestamp
+                elif entry.timestamp > group[1]:
+                    group[1] = entry.timestamp
+                group[2].append(entry)
 
-        for req_id, group_entries in req_groups.items():
+        for start_time, end_time, group_entries in req_groups.values():
             if len(group_entries) > 1:
-                valid_entries = [e for e in group_entries if e.timestamp]
-                if valid_entries:
-                    start_time = min(e.timestamp for e in valid_entries)
-                    end_time = max(e.timestamp for e in valid_entries)
-                    duration = max(1, int((end_time - start_time).total_seconds() * 1000))
-                    for entry in group_entries:
-                        entry.duration_ms = duration
+                duration = max(1, int((end_time - start_time).total_seconds() * 1000))
+                for entry in group_entries:
+                    entry.duration_ms = duration
         return entries
 
 
+# ========== UPLOAD PARSING ==========
+ALLOWED_UPLOAD_SUFFIXES = ('.json', '.log', '.txt')
+UPLOAD_READ_SIZE = 64 * 1024
+PARSE_BLOCK_BYTES = 4 * 1024 * 1024
+
+# Загрузки разбираются общим parser по очереди: last_valid_timestamp переходит
+# от блока к блоку, и блоки разных загрузок не перемешиваются
+parse_lock = asyncio.Lock()
+
+
+async def read_line_blocks(file: UploadFile, block_size: int = PARSE_BLOCK_BYTES) -> AsyncIterator[bytes]:
+    """Читает загрузку по UPLOAD_READ_SIZE и отдает блоки целых строк размером около block_size."""
+    buffer = bytearray()
+    # Конец последней целой строки в buffer: перевод строки ищется только в новом куске
+    cut = 0
+    while chunk := await file.read(UPLOAD_READ_SIZE):
+        newline = chunk.rfind(b'\n')
+        if newline != -1:
+            cut = len(buffer) + newline + 1
+        buffer += chunk
+        if len(buffer) >= block_size and cut:
+            yield bytes(buffer[:cut])
+            del buffer[:cut]
+            cut = 0
+    if buffer:
+        yield bytes(buffer)
+
+
+async def parse_upload(file: UploadFile) -> List[TerraformLogEntry]:
+    """
+    Parse an upload block by block while it is still being read.
+
+    Blocks go through the shared parser in a worker thread, so the event
+    loop stays responsive and the last timestamp carries over from one
+    block to the next.
+    """
+    entries = []
+    line_num = 1
+    async with parse_lock:
+        async for block in read_line_blocks(file):
+            entries.extend(await asyncio.to_thread(parser.parse_lines, block, file.filename, line_num))
+            line_num += block.count(b'\n')
+
+    return parser.finalize_entries(entries)
+
+
 # ========== GANTT GENERATOR ==========
 class ImprovedGanttGenerator:
-    def generate_gantt_data(self, entries: List[TerraformLogEntry]) -> List[Dict[str, Any]]:
-        groups = {}
+    def __init__(self):
+        # "req_id-operation" -> [start_time, end_time, entry_count, resources]; пополняется при загрузке
+        self.groups: Dict[str, list] = {}
+        # Ошибка сравнения timestamp в группе (naive и aware вперемешку): загрузку она
+        # не роняет, а отдается при построении диаграммы
+        self.error: Optional[TypeError] = None
+
+    def add_entries(self, entries: List[TerraformLogEntry]):
         for entry in entries:
             if entry.tf_req_id:
                 group_key = f"{entry.tf_req_id}-{entry.operation.value}"
-                if group_key not in groups:
-                    groups[group_key] = []
-                groups[group_key].append(entry)
+                group = self.groups.get(group_key)
+                if group is None:
+                    group = self.groups[group_key] = [entry.timestamp, entry.timestamp, 0, set()]
+                else:
+                    try:
+                        if entry.timestamp < group[0]:
+                            group[0] = entry.timestamp
+                        elif entry.timestamp > group[1]:
+                            group[1] = entry.timestamp
+                    except TypeError as e:
+                        self.error = e
+                group[2] += 1
+                if entry.tf_resource_type:
+                    group[3].add(entry.tf_resource_type)
+
+    def generate_gantt_data(self, entries: List[TerraformLogEntry]) -> List[Dict[str, Any]]:
+        if self.error is not None:
+            raise TypeError(str(self.error))
 
         gantt_data = []
-        for group_key, group_entries in groups.items():
-            valid_entries = [e for e in group_entries if e.timestamp]
-            if len(valid_entries) < 1:
-                continue
-
-            timestamps = [e.timestamp for e in valid_entries]
-            start_time = min(timestamps)
-            end_time = max(timestamps)
+        for group_key, (start_time, end_time, entry_count, resource_set) in self.groups.items():
             duration = (end_time - start_time).total_seconds()
-
-            operation = self._detect_group_operation(group_entries)
-            resources = list(set(e.tf_resource_type for e in group_entries if e.tf_resource_type))
+            # Все записи группы имеют одну операцию — она часть ключа
+            operation = group_key.rsplit('-', 1)[1]
+            resources = list(resource_set)
 
             gantt_data.append({
                 'id': group_key,
@@ -560,7 +731,7 @@ class ImprovedGanttGenerator:
                 'resource': ', '.join(resources) if resources else 'General',
                 'duration': max(duration, 1),
                 'type': operation,
-                'entry_count': len(group_entries),
+                'entry_count': entry_count,
                 'resources': resources,
                 'raw_duration': duration
             })
@@ -576,10 +747,6 @@ class ImprovedGanttGenerator:
             return f"{operation} - {resource_str}"
         return f"{operation} - General"
 
-    def _detect_group_operation(self, entries: List[TerraformLogEntry]) -> str:
-        operations = [e.operation.value for e in entries if e.operation != OperationType.UNKNOWN]
-        return max(set(operations), key=operations.count) if operations else 'unknown'
-
     def _create_time_based_groups(self, entries: List[TerraformLogEntry]) -> List[Dict[str, Any]]:
         if not entries:
             return []
@@ -639,13 +806,106 @@ class WebSocketManager:
             self.active_connections.remove(websocket)
 
     async def broadcast(self, message: str):
-        for connection in self.active_connections[:]:
-            try:
-                await connection.send_text(message)
-            except:
+        # Отправка всем клиентам идет параллельно; упавшие соединения отключаются
+        connections = self.active_connections[:]
+        results = await asyncio.gather(
+            *(connection.send_text(message) for connection in connections),
+            return_exceptions=True
+        )
+        for connection, result in zip(connections, results):
+            if isinstance(result, BaseException):
                 self.disconnect(connection)
 
 
+# ========== COLUMNAR STORE ==========
+# Сколько первых байт needle LogColumns.search сравнивает по всему буферу
+SEARCH_PREFIX_BYTES = 3
+
+
+class LogColumns:
+    """Колоночное (SoA) представление uploaded_logs для массовых фильтров и статистики."""
+
+    def __init__(self):
+        self.operation = np.empty(0, dtype=np.uint8)
+        self.level = np.empty(0, dtype=np.uint8)
+        # tf_resource_type хранится кодом из resource_type_codes; 0 — тип не указан
+        self.tf_resource_type = np.empty(0, dtype=np.int32)
+        self.resource_type_codes: Dict[str, int] = {'': 0}
+        self.read = np.empty(0, dtype=bool)
+        self.parse_error = np.empty(0, dtype=bool)
+        # Сообщение и tf_rpc каждой записи в нижнем регистре одним буфером: "message\0rpc\0",
+        # и начала записей в нем. Пара заменяется целиком, поэтому поиск идет без store_lock
+        self.search_index: Tuple[bytes, np.ndarray] = (b'', np.empty(0, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.read)
+
+    def extend(self, entries: List[TerraformLogEntry]):
+        self.operation = np.concatenate([
+            self.operation, np.array([OPERATION_CODES[e.operation] for e in entries], dtype=np.uint8)
+        ])
+        self.level = np.concatenate([self.level, np.array([LEVEL_CODES[e.level] for e in entries], dtype=np.uint8)])
+        codes = self.resource_type_codes
+        self.tf_resource_type = np.concatenate([self.tf_resource_type, np.array([
+            codes.setdefault(e.tf_resource_type, len(codes)) if isinstance(e.tf_resource_type, str) else 0
+            for e in entries
+        ], dtype=np.int32)])
+        self.read = np.concatenate([self.read, np.array([e.read for e in entries], dtype=bool)])
+        self.parse_error = np.concatenate([self.parse_error, np.array([e.parse_error for e in entries], dtype=bool)])
+
+        texts = [f"{e.message}\0{e.tf_rpc}\0".lower().encode('utf-8', 'surrogatepass') for e in entries]
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+        search_text, search_offsets = self.search_index
+        starts = len(search_text) + np.cumsum(lengths) - lengths
+        self.search_index = (search_text + b''.join(texts), np.concatenate([search_offsets, starts]))
+
+    def mask(self, operation: Optional[str] = None, level: Optional[str] = None,
+             resource_type: Optional[str] = None, show_read: bool = True,
+             show_parse_errors: bool = True) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        if operation:
+            mask &= self.operation == OPERATION_CODES.get(operation, -1)
+        if level:
+            mask &= self.level == LEVEL_CODES.get(level, -1)
+        if resource_type:
+            mask &= self.tf_resource_type == self.resource_type_codes.get(resource_type, -1)
+        if not show_read:
+            mask &= ~self.read
+        if not show_parse_errors:
+            mask &= ~self.parse_error
+        return mask
+
+    def search(self, needle: str, rows: int) -> np.ndarray:
+        """Mask of the first rows entries whose lowercased message or tf_rpc contains needle."""
+        search_text, search_offsets = self.search_index
+        end = int(search_offsets[rows]) if rows < len(search_offsets) else len(search_text)
+        pattern = needle.lower().encode('utf-8', 'surrogatepass')
+        found = np.zeros(rows, dtype=bool)
+        if len(pattern) > end:
+            return found
+
+        # Начала совпадений ищутся векторно: первые байты needle сравниваются по всему буферу,
+        # остальные проверяются только у оставшихся кандидатов
+        text = np.frombuffer(search_text, dtype=np.uint8, count=end)
+        last_start = end - len(pattern) + 1
+        prefix = min(len(pattern), SEARCH_PREFIX_BYTES)
+        candidates = text[:last_start] == pattern[0]
+        for shift in range(1, prefix):
+            candidates &= text[shift:last_start + shift] == pattern[shift]
+        hits = np.flatnonzero(candidates)
+        for shift in range(prefix, len(pattern)):
+            hits = hits[text[hits + shift] == pattern[shift]]
+
+        # Совпадение не пересекает "\0", поэтому целиком лежит в одной записи
+        found[np.searchsorted(search_offsets, hits, side='right') - 1] = True
+        return found
+
+    @staticmethod
+    def code_counts(column: np.ndarray, enum_cls: type) -> Dict[str, int]:
+        counts = np.bincount(column, minlength=len(enum_cls))
+        return {member.value: int(count) for member, count in zip(enum_cls, counts) if count}
+
+
 # ========== FASTAPI APP ==========
 app = FastAPI(
     title="Terraform LogViewer Pro - Competition Edition",
@@ -665,6 +925,7 @@ All endpoints are prefixed with `/api/v2/` for versioning.
 ## WebSocket
 Connect to `/ws` for real-time updates.""",
     version="7.0.0",
+    default_response_class=ORJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json",
@@ -692,6 +953,112 @@ websocket_manager = WebSocketManager()
 uploaded_logs: List[TerraformLogEntry] = []
 raw_uploaded_logs: List[dict] = []
 
+log_columns = LogColumns()
+# Эндпоинты чтения выполняются в threadpool FastAPI, а store_entries — в event loop.
+# Колонки и индекс raw-логов читаются и дописываются только под этой блокировкой
+store_lock = threading.Lock()
+# Позиция записи в uploaded_logs по ее id
+entry_positions: Dict[str, int] = {}
+
+# Обратный индекс raw_uploaded_logs для /filter: ключ -> строковое значение -> номера строк.
+# Ключи с большим числом различных значений (сообщения, id) не индексируются (None)
+RAW_INDEX_MAX_VALUES = 1024
+raw_value_index: Dict[str, Optional[Dict[str, List[int]]]] = {}
+# Строки, где значение ключа не строка: они всегда остаются кандидатами
+raw_other_rows: Dict[str, List[int]] = {}
+
+# Ключи raw-логов и поля записей, хотя бы раз встретившиеся с непустым значением
+non_null_fields: Set[str] = set()
+
+# Счетчики статистики, которых нет в колонках, считаются при загрузке
+global_stats: Dict[str, Counter] = {
+    'totals': Counter(),
+    'resource_types': Counter(),
+    'rpc_methods': Counter(),
+    'error_types': Counter()
+}
+
+
+def store_entries(entries: List[TerraformLogEntry]):
+    """Append parsed entries to uploaded_logs and update the columns and indexes."""
+    gantt_generator.add_entries(entries)
+
+    start = len(uploaded_logs)
+    uploaded_logs.extend(entries)
+    with store_lock:
+        log_columns.extend(entries)
+        for entry in entries:
+            if isinstance(entry.raw_data, dict):
+                index_raw_log(len(raw_uploaded_logs), entry.raw_data)
+                raw_uploaded_logs.append(entry.raw_data)
+
+    for idx, entry in enumerate(entries, start):
+        entry_positions.setdefault(entry.id, idx)
+
+        if entry.tf_resource_type:
+            global_stats['resource_types'][entry.tf_resource_type] += 1
+        if entry.tf_rpc:
+            global_stats['rpc_methods'][entry.tf_rpc] += 1
+        global_stats['totals']['json_blocks_count'] += len(entry.json_blocks)
+        if entry.level == LogLevel.ERROR:
+            global_stats['totals']['errors'] += 1
+        if entry.parse_error:
+            global_stats['totals']['parse_errors'] += 1
+            if entry.error_type:
+                global_stats['error_types'][entry.error_type] += 1
+
+    # Проверяются только поля записей, которые еще не встречались непустыми
+    remaining_fields = [name for name in ENTRY_FIELDS if name not in non_null_fields]
+    for entry in entries:
+        if not remaining_fields:
+            break
+        found_fields = [name for name in remaining_fields if getattr(entry, name) is not None]
+        if found_fields:
+            non_null_fields.update(found_fields)
+            remaining_fields = [name for name in remaining_fields if name not in non_null_fields]
+
+
+def index_raw_log(row: int, raw_log: dict):
+    for key, value in raw_log.items():
+        if value is not None:
+            non_null_fields.add(key)
+        values = raw_value_index.setdefault(key, {})
+        if not isinstance(value, str):
+            raw_other_rows.setdefault(key, []).append(row)
+        elif values is None:
+            continue
+        elif value in values:
+            values[value].append(row)
+        elif len(values) < RAW_INDEX_MAX_VALUES:
+            values[value] = [row]
+        else:
+            raw_value_index[key] = None
+
+
+def raw_candidate_rows(data: Dict[str, str]) -> Optional[List[int]]:
+    """
+    Narrow /filter down to rows that can match, using the raw log index.
+
+    Returns None when none of the requested keys is indexed and the caller
+    has to scan every row. Candidates still go through the full check.
+    """
+    candidates = None
+    other_rows = set()
+    for key, needle in data.items():
+        # Нестроковые значения не сужают выборку: их проверяет (или роняет) сам фильтр
+        other_rows.update(raw_other_rows.get(key, ()))
+        values = raw_value_index.get(key, {})
+        if values is None:
+            continue
+
+        rows = set()
+        for value, value_rows in values.items():
+            if needle in value:
+                rows.update(value_rows)
+        candidates = rows if candidates is None else candidates & rows
+
+    return None if candidates is None else sorted(candidates | other_rows)
+
 
 # ========== ENDPOINTS ==========
 @app.post(
@@ -710,13 +1077,12 @@ async def upload_logs_v2(file: UploadFile = File(...)):
     
     Returns parsing statistics and sample entries.
     """
-    if not file.filename.endswith(('.json', '.log', '.txt')):
+    if not file.filename.lower().endswith(ALLOWED_UPLOAD_SUFFIXES):
         raise HTTPException(400, "Only JSON, log and text files supported")
 
     try:
-        content = (await file.read()).decode('utf-8')
-        entries = parser.parse_log_file(content, file.filename)
-        uploaded_logs.extend(entries)
+        entries = await parse_upload(file)
+        store_entries(entries)
         
         parse_errors = [e for e in entries if e.parse_error]
         operation_stats = {}
@@ -726,12 +1092,12 @@ async def upload_logs_v2(file: UploadFile = File(...)):
 
         resource_types = list(set(e.tf_resource_type for e in entries if e.tf_resource_type))
 
-        await websocket_manager.broadcast(json.dumps({
+        await websocket_manager.broadcast(orjson.dumps({
             "type": "upload",
             "filename": file.filename,
             "entries_count": len(entries),
             "operations": list(operation_stats.keys())
-        }))
+        }).decode())
 
         return {
             "filename": file.filename,
@@ -751,13 +1117,14 @@ async def upload_logs_v2(file: UploadFile = File(...)):
     description="Retrieve filtered log entries with various query parameters",
     tags=["Entries"]
 )
-async def get_entries_v2(
+def get_entries_v2(
         operation: Optional[str] = Query(None, description="Filter by operation type"),
         level: Optional[str] = Query(None, description="Filter by log level"),
         resource_type: Optional[str] = Query(None, description="Filter by resource type"),
         search: Optional[str] = Query(None, description="Search in message and RPC fields"),
         show_read: bool = Query(True, description="Include read entries"),
-        show_parse_errors: bool = Query(True, description="Include parse errors")
+        show_parse_errors: bool = Query(True, description="Include parse errors"),
+        limit: Optional[int] = Query(None, ge=0, description="Maximum number of entries to return")
 ):
     """
     Get log entries with advanced filtering.
@@ -769,23 +1136,29 @@ async def get_entries_v2(
     - search: Search term in message and RPC fields
     - show_read: Include/exclude read entries
     - show_parse_errors: Include/exclude parse errors
+    - limit: Return only the latest this many matching entries
     """
-    filtered = uploaded_logs
-    if operation and operation != 'all':
-        filtered = [e for e in filtered if e.operation.value == operation]
-    if level and level != 'all':
-        filtered = [e for e in filtered if e.level.value == level]
-    if resource_type:
-        filtered = [e for e in filtered if e.tf_resource_type == resource_type]
-    if search:
-        filtered = [e for e in filtered if search.lower() in e.message.lower() or
-                    search.lower() in str(e.tf_rpc).lower()]
-    if not show_read:
-        filtered = [e for e in filtered if not e.read]
-    if not show_parse_errors:
-        filtered = [e for e in filtered if not e.parse_error]
-
-    return [e.to_dict() for e in filtered]
+    operation = operation if operation != 'all' else None
+    level = level if level != 'all' else None
+    with store_lock:
+        mask = log_columns.mask(operation, level, resource_type, show_read, show_parse_errors)
+    if search and '\0' not in search:
+        mask &= log_columns.search(search, len(mask))
+    rows = np.flatnonzero(mask)
+    if limit is not None:
+        # С limit совпадения перебираются с конца: нужны последние записи
+        rows = rows[::-1]
+    filtered = (uploaded_logs[idx] for idx in rows.tolist())
+
+    if search and '\0' in search:
+        # Разделитель буфера в самой строке поиска: проверка по записям
+        search = search.lower()
+        filtered = (e for e in filtered if search in e.message.lower() or search in str(e.tf_rpc).lower())
+
+    if limit is not None:
+        # Перебор останавливается на limit совпадениях, порядок записей восстанавливается
+        filtered = list(islice(filtered, limit))[::-1]
+    return ORJSONResponse([e.to_dict() for e in filtered])
 
 
 @app.get(
@@ -796,7 +1169,8 @@ async def get_entries_v2(
 )
 async def get_logs_keys():
     """Return all unique field keys from raw uploaded logs."""
-    return sorted(set().union(*raw_uploaded_logs))
+    # Ключи индекса — это все ключи, встречавшиеся в raw_uploaded_logs
+    return sorted(raw_value_index)
 
 
 @app.get(
@@ -807,21 +1181,7 @@ async def get_logs_keys():
 )
 async def get_logs_keys_enh():
     """Return all unique non-null fields from both raw and parsed logs."""
-    all_non_null_fields = set()
-    
-    for log in raw_uploaded_logs:
-        if isinstance(log, dict):
-            for key, value in log.items():
-                if value is not None:
-                    all_non_null_fields.add(key)
-    
-    for entry in uploaded_logs:
-        entry_dict = entry.model_dump()
-        for key, value in entry_dict.items():
-            if value is not None:
-                all_non_null_fields.add(key)
-    
-    return sorted(all_non_null_fields)
+    return sorted(non_null_fields)
 
 
 @app.post(
@@ -830,27 +1190,26 @@ async def get_logs_keys_enh():
     description="Filter raw logs using field-value pairs",
     tags=["Filter"]
 )
-async def filter_raw_logs(data: Dict[str, str]):
+def filter_raw_logs(data: Dict[str, str]):
     """
     Filter raw logs with exact field matching.
     
     Request body should be a JSON object with field-value pairs to match.
     Only logs containing all specified field-value pairs will be returned.
     """
-    logs = raw_uploaded_logs
+    with store_lock:
+        rows = raw_candidate_rows(data)
+        logs = raw_uploaded_logs[:] if rows is None else [raw_uploaded_logs[idx] for idx in rows]
 
-    def filter_local(log_row: Dict[str, str]) -> bool:
-        take = True
-        for key in data:
-            if key not in log_row:
-                return False
+    items = tuple(data.items())
 
-            if data[key] not in log_row[key]:
+    def filter_local(log_row: Dict[str, str]) -> bool:
+        for key, needle in items:
+            if key not in log_row or needle not in log_row[key]:
                 return False
-
         return True
 
-    return list(filter(filter_local, logs))
+    return ORJSONResponse(list(filter(filter_local, logs)))
 
 
 @app.post(
@@ -859,7 +1218,7 @@ async def filter_raw_logs(data: Dict[str, str]):
     description="Filter logs with enhanced matching using both raw and parsed data",
     tags=["Filter"]
 )
-async def filter_raw_logs_enh(data: Dict[str, str]):
+def filter_raw_logs_enh(data: Dict[str, str]):
     """
     Enhanced filtering that searches both raw logs and parsed model fields.
     
@@ -869,36 +1228,38 @@ async def filter_raw_logs_enh(data: Dict[str, str]):
     - Case-insensitive substring matching
     """
     if not data:
-        return [entry.to_dict() for entry in uploaded_logs]
+        return ORJSONResponse([entry.to_dict() for entry in uploaded_logs])
     
+    # Значения фильтров приводятся к нижнему регистру один раз, а не на каждой строке
+    filters = [(field, filter_value.lower()) for field, filter_value in data.items()]
     matching_indices = []
     
     for idx, raw_log in enumerate(raw_uploaded_logs):
         matches_all_filters = True
         
-        for field, filter_value in data.items():
+        for field, filter_value in filters:
             if field in raw_log:
                 field_value = str(raw_log[field])
-                if filter_value.lower() not in field_value.lower():
+                if filter_value not in field_value.lower():
                     matches_all_filters = False
                     break
             elif idx < len(uploaded_logs):
                 entry = uploaded_logs[idx]
-                if field == 'level' and entry.level.value.lower() != filter_value.lower():
+                if field == 'level' and entry.level.value != filter_value:
                     matches_all_filters = False
                     break
-                elif field == 'operation' and entry.operation.value.lower() != filter_value.lower():
+                elif field == 'operation' and entry.operation.value != filter_value:
                     matches_all_filters = False
                     break
-                elif field == 'message' and filter_value.lower() not in entry.message.lower():
+                elif field == 'message' and filter_value not in entry.message.lower():
                     matches_all_filters = False
                     break
-                elif field == 'module' and entry.module and filter_value.lower() not in entry.module.lower():
+                elif field == 'module' and entry.module and filter_value not in entry.module.lower():
                     matches_all_filters = False
                     break
                 elif hasattr(entry, field):
                     field_value = str(getattr(entry, field) or '')
-                    if filter_value.lower() not in field_value.lower():
+                    if filter_value not in field_value.lower():
                         matches_all_filters = False
                         break
                 else:
@@ -916,7 +1277,7 @@ async def filter_raw_logs_enh(data: Dict[str, str]):
         if idx < len(uploaded_logs):
             filtered_entries.append(uploaded_logs[idx].to_dict())
     
-    return filtered_entries
+    return ORJSONResponse(filtered_entries)
 
 
 @app.get(
@@ -938,37 +1299,17 @@ async def get_statistics():
     - JSON blocks count
     - Error type breakdown
     """
-    stats = {
+    return {
         'total_entries': len(uploaded_logs),
-        'parse_errors': len([e for e in uploaded_logs if e.parse_error]),
-        'operations': {},
-        'levels': {},
-        'resource_types': {},
-        'rpc_methods': {},
-        'json_blocks_count': 0,
-        'error_types': {}
+        'parse_errors': global_stats['totals']['parse_errors'],
+        'operations': LogColumns.code_counts(log_columns.operation, OperationType),
+        'levels': LogColumns.code_counts(log_columns.level, LogLevel),
+        'resource_types': dict(global_stats['resource_types']),
+        'rpc_methods': dict(global_stats['rpc_methods']),
+        'json_blocks_count': global_stats['totals']['json_blocks_count'],
+        'error_types': dict(global_stats['error_types'])
     }
 
-    for entry in uploaded_logs:
-        op = entry.operation.value
-        stats['operations'][op] = stats['operations'].get(op, 0) + 1
-
-        level = entry.level.value
-        stats['levels'][level] = stats['levels'].get(level, 0) + 1
-
-        if entry.tf_resource_type:
-            stats['resource_types'][entry.tf_resource_type] = stats['resource_types'].get(entry.tf_resource_type, 0) + 1
-
-        if entry.tf_rpc:
-            stats['rpc_methods'][entry.tf_rpc] = stats['rpc_methods'].get(entry.tf_rpc, 0) + 1
-
-        stats['json_blocks_count'] += len(entry.json_blocks)
-
-        if entry.parse_error and entry.error_type:
-            stats['error_types'][entry.error_type] = stats['error_types'].get(entry.error_type, 0) + 1
-
-    return stats
-
 
 @app.get(
     "/api/v2/gantt-data",
@@ -990,35 +1331,57 @@ async def get_gantt_data():
 )
 async def mark_as_read(entry_id: str):
     """Mark a log entry as read by its ID."""
-    for entry in uploaded_logs:
-        if entry.id == entry_id:
-            entry.read = True
-            return {"status": "marked as read"}
-    raise HTTPException(404, "Entry not found")
+    idx = entry_positions.get(entry_id)
+    if idx is None:
+        raise HTTPException(404, "Entry not found")
+    uploaded_logs[idx].read = True
+    log_columns.read[idx] = True
+    return {"status": "marked as read"}
 
 
 # ========== EXPORT ENDPOINTS ==========
+CSV_EXPORT_FIELDS = ('id', 'timestamp', 'level', 'operation', 'message', 'tf_req_id', 'tf_resource_type', 'tf_rpc')
+CSV_BATCH_ROWS = 10000
+
+
+def iter_csv_batches(entries: List[TerraformLogEntry]) -> Iterator[str]:
+    """Serialize entries to CSV, yielding CSV_BATCH_ROWS rows at a time."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(CSV_EXPORT_FIELDS)
+
+    rows = iter(entries)
+    while True:
+        writer.writerows(
+            (entry.id, entry.timestamp.isoformat(), entry.level.value, entry.operation.value, entry.message,
+             entry.tf_req_id or '', entry.tf_resource_type or '', entry.tf_rpc or '')
+            for entry in islice(rows, CSV_BATCH_ROWS)
+        )
+        batch = output.getvalue()
+        if not batch:
+            return
+        yield batch
+        output.seek(0)
+        output.truncate()
+
+
 @app.get(
     "/api/export/json",
     summary="Export as JSON",
     description="Export filtered logs as JSON",
     tags=["Export"]
 )
-async def export_json(
+def export_json(
         operation: Optional[str] = Query(None, description="Filter by operation type"),
         level: Optional[str] = Query(None, description="Filter by log level"),
         resource_type: Optional[str] = Query(None, description="Filter by resource type")
 ):
     """Export filtered log entries in JSON format."""
-    filtered = uploaded_logs
-    if operation:
-        filtered = [e for e in filtered if e.operation.value == operation]
-    if level:
-        filtered = [e for e in filtered if e.level.value == level]
-    if resource_type:
-        filtered = [e for e in filtered if e.tf_resource_type == resource_type]
+    with store_lock:
+        mask = log_columns.mask(operation, level, resource_type)
+    filtered = [uploaded_logs[idx] for idx in np.flatnonzero(mask).tolist()]
 
-    return [e.to_dict() for e in filtered]
+    return ORJSONResponse([e.to_dict() for e in filtered])
 
 
 @app.get(
@@ -1027,40 +1390,18 @@ async def export_json(
     description="Export filtered logs as CSV file",
     tags=["Export"]
 )
-async def export_csv(
+def export_csv(
         operation: Optional[str] = Query(None, description="Filter by operation type"),
         level: Optional[str] = Query(None, description="Filter by log level"),
         resource_type: Optional[str] = Query(None, description="Filter by resource type")
 ):
     """Export filtered log entries as CSV download."""
-    filtered = uploaded_logs
-    if operation:
-        filtered = [e for e in filtered if e.operation.value == operation]
-    if level:
-        filtered = [e for e in filtered if e.level.value == level]
-    if resource_type:
-        filtered = [e for e in filtered if e.tf_resource_type == resource_type]
+    with store_lock:
+        mask = log_columns.mask(operation, level, resource_type)
+    filtered = [uploaded_logs[idx] for idx in np.flatnonzero(mask).tolist()]
 
-    output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=['id', 'timestamp', 'level', 'operation', 'message', 'tf_req_id',
-                                                'tf_resource_type', 'tf_rpc'])
-    writer.writeheader()
-
-    for entry in filtered:
-        writer.writerow({
-            'id': entry.id,
-            'timestamp': entry.timestamp.isoformat(),
-            'level': entry.level.value,
-            'operation': entry.operation.value,
-            'message': entry.message,
-            'tf_req_id': entry.tf_req_id or '',
-            'tf_resource_type': entry.tf_resource_type or '',
-            'tf_rpc': entry.tf_rpc or ''
-        })
-
-    output.seek(0)
     return StreamingResponse(
-        iter([output.getvalue()]),
+        iter_csv_batches(filtered),
         media_type="text/csv",
         headers={"Content-Disposition": "attachment; filename=terraform_logs.csv"}
     )
@@ -1086,8 +1427,7 @@ async def grpc_status():
 )
 async def grpc_process():
     """Process logs through gRPC plugins and return results."""
-    error_count = len([e for e in uploaded_logs if e.level == LogLevel.ERROR])
-    return {"processed_entries": len(uploaded_logs), "errors_found": error_count}
+    return {"processed_entries": len(uploaded_logs), "errors_found": global_stats['totals']['errors']}
 
 
 # ========== WEBSOCKET ==========
@@ -1125,7 +1465,7 @@ async def health_check():
         "timestamp": datetime.now().isoformat(),
         "statistics": {
             "total_logs": len(uploaded_logs),
-            "parse_errors": len([e for e in uploaded_logs if e.parse_error])
+            "parse_errors": global_stats['totals']['parse_errors']
         }
     }
 